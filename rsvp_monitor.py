@@ -8,17 +8,22 @@ RSVP Cigars product/price monitor
 • Diffs against previous snapshot and posts Discord alerts
 """
 
+import asyncio
+import hashlib
 import html
-import json
 import os
 import re
 import time
+from concurrent.futures import Executor, ProcessPoolExecutor
 from datetime import datetime
-from decimal import Decimal
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
+import aiohttp
+import orjson
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ───────────────────────────────  CONFIG  ──────────────────────────────
 BASE_URL = "https://rsvpcigars.com"
@@ -28,101 +33,228 @@ HEADERS = {"User-Agent": "Mozilla/5.0 (RSVPMonitor/1.0)"}
 DATA_FILE = "previous_products.json"
 PRODUCT_RE = re.compile(r"-p\d+/")               # product URL pattern
 PRICE_RE = re.compile(r"\$[\d,]+\.\d{2}")        # $1,234.56
+LINK_RE = re.compile(r"""<a\b[^>]*?(?<![\w-])href\s*=\s*"""   # <a …> href value
+                     r"""(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""", re.I)
+META_PRICE_RE = re.compile(r"""<meta\b[^>]*?(?<![\w-])itemprop\s*=\s*"""  # first
+                           r"""(?-i:"price"|'price'|price(?=[\s/>]))[^>]*>""",  # price
+                           re.I)                                           # <meta>
+META_CONTENT_RE = re.compile(r"""(?<![\w-])content\s*=\s*"""
+                             r"""(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""", re.I)
+PRODUCT_LINKS = SoupStrainer("a", href=PRODUCT_RE)  # build only these nodes
 
 WEBHOOK = os.getenv("DISCORD_WEBHOOK")           # GitHub secret
 MAX_LEN = 2000                                   # Discord hard cap
 RATE_PAUSE = 0.3                                 # 5 req/s safety
+CONCURRENCY = 8                                  # parallel page fetches
+PARSE_CACHE_SIZE = 256                           # memoised pages per process
+
+# one pooled keep-alive session for every blocking HTTP call
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16,
+                                      max_retries=Retry(total=3, backoff_factor=0.3)))
 
 # ───────────────────────────────  SCRAPING  ────────────────────────────
-def fetch_soup(url: str, session: requests.Session) -> BeautifulSoup:
-    r = session.get(url, timeout=15)
-    r.raise_for_status()
-    return BeautifulSoup(r.text, "html.parser")
+async def fetch_html(url: str, session: aiohttp.ClientSession,
+                     sem: asyncio.Semaphore,
+                     prev: Optional[Dict[str, str]] = None
+                     ) -> Tuple[Optional[str], Dict[str, Optional[str]]]:
+    """Return (body, validators); body is None when the page is unchanged (304)."""
+    headers = {}
+    if prev and prev.get("etag"):
+        headers["If-None-Match"] = prev["etag"]
+    if prev and prev.get("last_modified"):
+        headers["If-Modified-Since"] = prev["last_modified"]
+
+    async with sem, session.get(url, headers=headers,
+                                timeout=aiohttp.ClientTimeout(total=15)) as r:
+        if r.status == 304:
+            return None, {}
+        r.raise_for_status()
+        validators = {"etag": r.headers.get("ETag"),
+                      "last_modified": r.headers.get("Last-Modified")}
+        return await r.text(), validators
+
+
+def to_cents(price: str) -> int:
+    """“$1,234.5” / “1234.50” → 123450."""
+    whole, _, frac = price.replace("$", "").replace(",", "").partition(".")
+    return int(whole or 0) * 100 + int((frac + "00")[:2])
+
+
+def fmt_cents(cents: int) -> str:
+    return f"${cents // 100:,}.{cents % 100:02d}"
+
 
+def scan_links(text: str) -> Set[str]:
+    """One regex pass over a raw catalogue page → product hrefs."""
+    hrefs = {html.unescape("".join(m)) for m in LINK_RE.findall(text)}
+    return {h for h in hrefs if PRODUCT_RE.search(h)}
 
-def parse_price(soup: BeautifulSoup) -> str:
-    """Return the live USD price as “$#,###.##”."""
+
+def price_from_html(text: str) -> Optional[Tuple[str, int]]:
+    """Fast path: read the micro-data price straight from the raw body."""
+    tag = META_PRICE_RE.search(text)
+    m = META_CONTENT_RE.search(tag.group()) if tag else None
+    content = html.unescape("".join(m.groups(""))) if m else ""
+    if not re.fullmatch(r"[\d.]+", content):
+        return None                               # let parse_price decide
+    cents = to_cents(content)
+    return fmt_cents(cents), cents
+
+
+def parse_price(soup: BeautifulSoup) -> Tuple[str, int]:
+    """Return the live USD price as (“$#,###.##”, cents)."""
     # 1️⃣  Most reliable: micro-data
-    meta = soup.select_one('meta[itemprop="price"]')
+    meta = soup.find("meta", itemprop="price")
     if meta and meta.get("content"):
-        return f"${Decimal(meta['content']):,}"
+        cents = to_cents(meta["content"])
+        return fmt_cents(cents), cents
 
     # 2️⃣  Visible span markup
     tag = (
-        soup.select_one("span.price") or
-        soup.select_one("span.price-item--sale") or
-        soup.select_one("span.price-item")
+        soup.find("span", class_="price") or
+        soup.find("span", class_="price-item--sale") or
+        soup.find("span", class_="price-item")
     )
-    if tag and PRICE_RE.search(tag.get_text()):
-        return PRICE_RE.search(tag.get_text()).group()
+    m = PRICE_RE.search(tag.get_text()) if tag else None
+    if m:
+        return m.group(), to_cents(m.group())
 
     # 3️⃣  Last resort: scan all text
     prices = PRICE_RE.findall(soup.get_text(" ", strip=True))
     if prices:
-        return prices[-1]
+        return prices[-1], to_cents(prices[-1])
 
     raise ValueError("Price not found")
 
 
-def fetch_all_products() -> List[Dict[str, str]]:
-    session = requests.Session()
-    session.headers.update(HEADERS)
+_PARSED: Dict[bytes, Tuple[str, str, int]] = {}  # sha1(html) → parse result
 
-    product_urls = set()
-    # single pages today; loop allows pagination if Shopify ever splits
-    for seed in SEED_PAGES:
-        page = 1
-        while True:
-            soup = fetch_soup(f"{seed}?page={page}", session)
-            new_links = {
-                BASE_URL + a["href"] if not a["href"].startswith("http") else a["href"]
-                for a in soup.find_all("a", href=True) if PRODUCT_RE.search(a["href"])
-            }
-            if not new_links or new_links.issubset(product_urls):
-                break
-            product_urls |= new_links
-            page += 1
-
-    products = []
-    for url in sorted(product_urls):
-        s = fetch_soup(url, session)
+
+def parse_page(text: str) -> Tuple[str, str, int]:
+    """(title, price, cents) for one product page, memoised on its SHA-1."""
+    key = hashlib.sha1(text.encode()).digest()
+    if key not in _PARSED:
+        s = BeautifulSoup(text, "lxml")
         title = s.find("h1").get_text(strip=True)
-        price = parse_price(s)
-        products.append({"title": title, "price": price, "url": url})
-    return products
+        price, cents = price_from_html(text) or parse_price(s)
+        if len(_PARSED) >= PARSE_CACHE_SIZE:
+            del _PARSED[next(iter(_PARSED))]      # evict the oldest entry
+        _PARSED[key] = (title, price, cents)
+    return _PARSED[key]
+
+
+def parse_product(text: str, url: str) -> Dict:
+    """CPU-bound half of a product scrape; runs in the process pool."""
+    title, price, cents = parse_page(text)
+    return {"title": title, "price": price, "price_cents": cents, "url": url}
+
+
+async def scrape_product(url: str, session: aiohttp.ClientSession,
+                         sem: asyncio.Semaphore, pool: Executor,
+                         prev: Optional[Dict] = None) -> Dict:
+    text, validators = await fetch_html(url, session, sem, prev)
+    if text is None:                              # 304 – reuse last snapshot
+        return prev
+    loop = asyncio.get_running_loop()
+    product = await loop.run_in_executor(pool, parse_product, text, url)
+    return {**product, **validators}
+
+
+async def collect_links(seed: str, session: aiohttp.ClientSession,
+                        sem: asyncio.Semaphore, cache: Dict[str, Dict]
+                        ) -> Tuple[Set[str], Dict[str, Dict]]:
+    """Crawl one catalogue root; unchanged pages (304) reuse *cache*."""
+    urls: Set[str] = set()
+    pages: Dict[str, Dict] = {}
+    # single pages today; loop allows pagination if Shopify ever splits
+    page = 1
+    while True:
+        url = f"{seed}?page={page}"
+        text, validators = await fetch_html(url, session, sem, cache.get(url))
+        if text is None:                          # 304 – same links as last run
+            pages[url] = cache[url]
+            new_links = set(cache[url]["urls"])
+        else:
+            hrefs = scan_links(text)
+            if not hrefs:                         # markup drifted? ask the DOM
+                soup = BeautifulSoup(text, "lxml", parse_only=PRODUCT_LINKS)
+                hrefs = {a["href"] for a in soup.find_all("a")}
+                if hrefs:
+                    print(f"⚠️  link regex missed {len(hrefs)} products on {url}")
+            new_links = {h if h.startswith("http") else BASE_URL + h for h in hrefs}
+            pages[url] = {"urls": sorted(new_links), **validators}
+        if not new_links or new_links.issubset(urls):
+            break
+        urls |= new_links
+        page += 1
+    return urls, pages
+
+
+async def fetch_all_products(previous: Dict, pool: Executor
+                             ) -> Tuple[List[Dict], Dict[str, Dict]]:
+    prev_by_url = {p["url"]: p for p in previous["products"]}
+    connector = aiohttp.TCPConnector(limit=16, limit_per_host=CONCURRENCY,
+                                     ttl_dns_cache=300)
+    sem = asyncio.Semaphore(CONCURRENCY)
+    async with aiohttp.ClientSession(connector=connector, headers=HEADERS) as session:
+        crawled = await asyncio.gather(*[collect_links(s, session, sem, previous["seeds"])
+                                         for s in SEED_PAGES])
+        product_urls: Set[str] = set()
+        seeds: Dict[str, Dict] = {}
+        for urls, pages in crawled:
+            product_urls |= urls
+            seeds.update(pages)
+        products = await asyncio.gather(*[
+            scrape_product(u, session, sem, pool, prev_by_url.get(u))
+            for u in sorted(product_urls)
+        ])
+    return list(products), seeds
 
 # ────────────────────────────  DIFF & STORE  ───────────────────────────
-def load_previous() -> List[Dict[str, str]]:
+def load_previous() -> Dict:
+    """Return the last snapshot as {"products": [...], "seeds": {...}}."""
     if not os.path.exists(DATA_FILE):
-        return []
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+        return {"products": [], "seeds": {}}
+    with open(DATA_FILE, "rb") as f:
+        snap = orjson.loads(f.read())
+    # snapshots are {"scraped_at", "products", "seeds"}; tolerate a bare list
+    if isinstance(snap, list):
+        snap = {"products": snap}
+    snap.setdefault("seeds", {})
+    for p in snap["products"]:
+        p.setdefault("price_cents", to_cents(p["price"]))
+    return snap
 
 
-def save_snapshot(products: List[Dict[str, str]]) -> None:
+def save_snapshot(products: List[Dict], seeds: Dict[str, Dict],
+                  previous: Dict) -> None:
+    if products == previous["products"] and seeds == previous["seeds"]:
+        return                                    # no-op run: leave file alone
     snap = {"scraped_at": datetime.utcnow().isoformat(timespec="seconds"),
-            "products": products}
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(snap, f, indent=2)
+            "products": products, "seeds": seeds}
+    tmp = DATA_FILE + ".tmp"                      # never leave a half-written file
+    with open(tmp, "wb") as f:
+        f.write(orjson.dumps(snap, option=orjson.OPT_SORT_KEYS))
+    os.replace(tmp, DATA_FILE)
 
 
-def compare(old: List[Dict[str, str]], new: List[Dict[str, str]]) -> Dict[str, List]:
+def compare(old: List[Dict], new: List[Dict]) -> Dict[str, List]:
     changes = {"new": [], "price": []}
-    old_lookup = {p["title"]: p for p in old}
+    old_lookup = {p["url"]: p for p in old}      # URL is the stable key
 
     for item in new:
-        if item["title"] not in old_lookup:
+        prev = old_lookup.get(item["url"])
+        if prev is None:
             changes["new"].append(item)
-        else:
-            o = Decimal(old_lookup[item["title"]]["price"].strip("$").replace(",", ""))
-            n = Decimal(item["price"].strip("$").replace(",", ""))
-            if o != n:
-                changes["price"].append({
-                    "title": item["title"],
-                    "old": f"${o:,}",
-                    "new": f"${n:,}",
-                    "url": item["url"]
-                })
+        elif prev["price_cents"] != item["price_cents"]:
+            changes["price"].append({
+                "title": item["title"],
+                "old": fmt_cents(prev["price_cents"]),
+                "new": fmt_cents(item["price_cents"]),
+                "url": item["url"]
+            })
     return changes
 
 # ────────────────────────  DISCORD HELPER  ────────────────────────────
@@ -139,30 +271,51 @@ def compose_discord(ch: Dict[str, List]) -> str:
     return msg or "Nothing changed, but monitor ran."
 
 
+def chunk_lines(message: str, cap: int) -> Iterator[str]:
+    """Yield chunks of at most *cap* chars, splitting only between lines."""
+    buf = ""
+    for line in message.split("\n"):
+        while len(line) > cap:                    # a single line over the cap
+            if buf:
+                yield buf
+                buf = ""
+            yield line[:cap]
+            line = line[cap:]
+        if buf and len(buf) + 1 + len(line) > cap:
+            yield buf
+            buf = line
+        else:
+            buf = f"{buf}\n{line}" if buf else line
+    if buf:
+        yield buf
+
+
 def send_alert(message: str) -> None:
     if not WEBHOOK:
         print("⚠️  DISCORD_WEBHOOK not set; skipping alert.")
         return
 
-    for i in range(0, len(message), MAX_LEN):
-        chunk = message[i:i + MAX_LEN]
-        r = requests.post(WEBHOOK, json={"content": chunk}, timeout=10)
+    chunks = list(chunk_lines(message, MAX_LEN))
+    for idx, chunk in enumerate(chunks):
+        r = SESSION.post(WEBHOOK, params={"wait": "false"},
+                         json={"content": chunk}, timeout=10)
         if r.status_code >= 400:
             print(f"Discord error {r.status_code}: {r.text}")
             r.raise_for_status()
-        if len(message) > MAX_LEN:
+        if idx < len(chunks) - 1:
             time.sleep(RATE_PAUSE)        # keep under 5 req/s
 
 # ────────────────────────────────  MAIN  ───────────────────────────────
 def main() -> None:
-    current = fetch_all_products()
-    old_products = load_previous()
-    diff = compare(old_products, current)
+    previous = load_previous()
+    with ProcessPoolExecutor() as pool:
+        current, seeds = asyncio.run(fetch_all_products(previous, pool))
+    diff = compare(previous["products"], current)
 
     if diff["new"] or diff["price"]:
         send_alert(compose_discord(diff))
 
-    save_snapshot(current)
+    save_snapshot(current, seeds, previous)
     print(f"{datetime.now():%Y-%m-%d %H:%M:%S} – scan complete.")
 
 if __name__ == "__main__":
@@ -0,0 +1,54 @@
+import pytest
+from bs4 import BeautifulSoup
+
+from rsvp_monitor import PRODUCT_LINKS, parse_price, price_from_html, scan_links
+
+CATALOGUE_PAGE = """
+<html><head>
+  <link rel="canonical" href="/en/cubans/canonical-p9/">
+</head><body>
+  <a href="/en/cubans/foo-p1/"><img src="foo.jpg"></a>
+  <a href="/en/cubans/foo-p1/">Foo</a>
+  <A HREF="/en/cubans/up-p2/">Upper</A>
+  <a href='/en/cubans/sq-p3/'>Single</a>
+  <a class="card" href = "/en/cubans/amp-p4/?a=1&amp;b=2">Amp</a>
+  <a href=/en/cubans/bare-p5/>Bare</a>
+  <a data-href="/en/cubans/bad-p7/" href="/en/cubans/good-p8/">Good</a>
+  <a href="https://rsvpcigars.com/en/cubans/abs-p6/">Absolute</a>
+  <a href="/en/cubans/">Not a product</a>
+  <abbr title="x" href="/en/cubans/abbr-p10/">no</abbr>
+</body></html>
+"""
+
+
+def test_scan_links_matches_dom_parse():
+    soup = BeautifulSoup(CATALOGUE_PAGE, "lxml", parse_only=PRODUCT_LINKS)
+    dom = {a["href"] for a in soup.find_all("a")}
+    assert scan_links(CATALOGUE_PAGE) == dom
+
+
+PRODUCT_PAGES = [
+    # plain micro-data
+    '<h1>Foo</h1><meta itemprop="price" content="1234.5">',
+    # a non-meta itemprop=price must not win over the meta tag
+    '<span itemprop="price" content="99.00">$99.00</span>'
+    '<meta content="12.50" itemprop="price">',
+    # data-itemprop decoy, upper-case and single-quoted markup
+    '<meta data-itemprop="price" content="5.00">'
+    "<META ITEMPROP=\"price\" CONTENT='7.25'>",
+    # first price meta has no content: fall through to the span
+    '<meta itemprop="price"><meta itemprop="price" content="3.00">'
+    '<span class="price">$4.00</span>',
+    # unquoted attributes, self-closing tag
+    "<meta itemprop=price content=42.5 />",
+]
+
+
+@pytest.mark.parametrize("page", PRODUCT_PAGES)
+def test_price_from_html_matches_parse_price(page):
+    fast = price_from_html(page)
+    assert fast is None or fast == parse_price(BeautifulSoup(page, "lxml"))
+
+
+def test_price_from_html_hits_plain_micro_data():
+    assert price_from_html(PRODUCT_PAGES[0]) == ("$1,234.50", 123450)